@@ -1,5 +1,7 @@
 from pathlib import Path
 
+import orjson
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -27,6 +29,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'scraper.apps.ScraperConfig',
     'rest_framework',
+    'adrf',
 ]
 
 MIDDLEWARE = [
@@ -70,6 +73,20 @@ DATABASES = {
 }
 
 
+# Django REST Framework
+# https://www.django-rest-framework.org/api-guide/settings/
+
+REST_FRAMEWORK = {
+    # Scrape responses can be large, so JSON is encoded with orjson instead of the stdlib json module
+    'DEFAULT_RENDERER_CLASSES': [
+        'drf_orjson_renderer.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    # Validation errors of list fields are keyed by item index, which orjson rejects by default
+    'ORJSON_RENDERER_OPTIONS': (orjson.OPT_NON_STR_KEYS,),
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -1,17 +1,21 @@
-from rest_framework.views import APIView
+import asyncio
+
+from adrf.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
 from scraper.api.serializer import URLArraySerializer
-from scraper.utils import extract_data_from_urls
+from scraper.utils import session_scope, url_batcher
 
 class ScraperAPIView(APIView):
-    def post(self, request, *args, **kwargs):
+    async def post(self, request, *args, **kwargs):
         serializer = URLArraySerializer(data=request.data)
 
         if serializer.is_valid():
             urls = serializer.validated_data['urls']
-            extracted_data = extract_data_from_urls(urls)
+            async with session_scope():
+                # URLs go through the shared batcher, so requests made at the same time share their fetches
+                extracted_data = await asyncio.gather(*(url_batcher.process(url) for url in urls))
             return Response(data=extracted_data, status=status.HTTP_200_OK)
         else:
             # Return validation errors
@@ -1,6 +1,16 @@
-from django.test import TestCase
+import asyncio
+import os
+import tempfile
+import threading
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
 
-from scraper.utils import extract_data_from_urls, get_html, parse_html
+from django.test import AsyncClient, TestCase
+
+from scraper import utils
+from scraper.utils import URLBatcher, extract_data_from_urls, get_html, parse_html, url_resolver
 
 # Create your tests here.
 
@@ -20,4 +30,335 @@ class ScraperTestCase(TestCase):
             all_data = extract_data_from_urls(self.urls)
         
         for data in all_data:
-            print(data)
\ No newline at end of file
+            print(data)
+
+class ParseHtmlTestCase(TestCase):
+    def test_parse_html_services_block(self):
+        """
+        Test that links are taken from the services block when it is present.
+        """
+        html = (
+            '<div id="block-menu-menu-egov-services"><ul>'
+            '<li><a href="/ne/tax"> Online <b>Tax</b> </a></li>'
+            '<li><a href="">Empty</a></li>'
+            '</ul></div>'
+            '<ul><li><a href="/other">विद्युतीय सेवा</a></li></ul>'
+        )
+        self.assertEqual(parse_html('https://example.gov.np/', html), [
+            {'service_name': 'OnlineTax', 'link_of_service': 'https://example.gov.np/ne/tax'},
+        ])
+
+    def test_parse_html_nested_services_block(self):
+        """
+        Test that only links inside the services block are returned when it contains nested divs.
+        """
+        html = (
+            '<div class="region"><div id="block-menu-menu-egov-services" class="block">'
+            '<div class="content"><a href="https://ebps.example.gov.np/">EBPS</a></div>'
+            '<div><a href="/ne/map">Map</a></div>'
+            '</div><div><a href="/ne/news">News</a></div></div>'
+        )
+        self.assertEqual(parse_html('https://example.gov.np/', html), [
+            {'service_name': 'EBPS', 'link_of_service': 'https://ebps.example.gov.np'},
+            {'service_name': 'Map', 'link_of_service': 'https://example.gov.np/ne/map'},
+        ])
+
+    def test_parse_html_service_text_fallback(self):
+        """
+        Test that links are taken from the list item of the matching link when there is no services block.
+        """
+        html = (
+            '<ul><li><a href="/">विद्युतीय सुशासन सेवाहरु</a>'
+            '<ul><li><a href="https://eservice.example.gov.np/">Revenue</a></li></ul>'
+            '</li><li><a href="/about">About</a></li></ul>'
+        )
+        self.assertEqual(parse_html('https://example.gov.np/', html), [
+            {'service_name': 'विद्युतीय सुशासन सेवाहरु', 'link_of_service': 'https://example.gov.np'},
+            {'service_name': 'Revenue', 'link_of_service': 'https://eservice.example.gov.np'},
+        ])
+
+
+class ParseHtmlEncodingTestCase(TestCase):
+    def page(self, name, charset=None):
+        meta = '<meta charset="%s">' % charset if charset else ''
+        return '%s<div id="block-menu-menu-egov-services"><a href="/s">%s</a></div>' % (meta, name)
+
+    def service_names(self, html, encoding=None):
+        return [service['service_name'] for service in parse_html('https://example.gov.np/', html, encoding)]
+
+    def test_parse_html_header_charset(self):
+        """
+        Test that the Content-Type charset is used to decode the page.
+        """
+        html = self.page('Café').encode('iso-8859-1')
+        self.assertEqual(self.service_names(html, 'ISO-8859-1'), ['Café'])
+
+    def test_parse_html_meta_charset(self):
+        """
+        Test that the <meta> charset is used when there is no Content-Type charset, including
+        charsets that only Python can decode.
+        """
+        for charset, name in [('windows-1252', 'Café'), ('euc-jp', '電子申請'), ('iso-2022-jp', '電子申請'), ('mac-roman', 'Café')]:
+            with self.subTest(charset=charset):
+                html = self.page(name, charset).encode(charset)
+                self.assertEqual(self.service_names(html), [name])
+
+    def test_parse_html_unknown_charset(self):
+        """
+        Test that pages with an unknown charset are parsed as UTF-8 instead of failing.
+        """
+        self.assertEqual(self.service_names(self.page('विद्युतीय', 'x-unknown').encode('utf-8')), ['विद्युतीय'])
+        self.assertEqual(self.service_names(self.page('विद्युतीय').encode('utf-8'), 'x-unknown'), ['विद्युतीय'])
+
+
+class URLResolverTestCase(TestCase):
+    def test_url_resolver(self):
+        """
+        Test that absolute, root-relative and relative URLs are resolved against the base URL.
+        """
+        resolve = url_resolver('https://example.gov.np/ne/')
+        self.assertEqual(resolve('https://eservice.example.gov.np/'), 'https://eservice.example.gov.np')
+        self.assertEqual(resolve('/'), 'https://example.gov.np')
+        self.assertEqual(resolve('/ne/content/tax/'), 'https://example.gov.np/ne/content/tax')
+        self.assertEqual(resolve('//cdn.example.gov.np/a'), 'https://cdn.example.gov.np/a')
+        self.assertEqual(resolve('content/tax'), 'https://example.gov.np/content/tax')
+
+    def test_url_resolver_removes_dot_segments(self):
+        """
+        Test that dot segments in root-relative paths are resolved as `urljoin` does.
+        """
+        resolve = url_resolver('https://example.gov.np/ne/')
+        self.assertEqual(resolve('/a/../b'), 'https://example.gov.np/b')
+        self.assertEqual(resolve('/./c'), 'https://example.gov.np/c')
+        self.assertEqual(resolve('/a/..'), 'https://example.gov.np')
+        self.assertEqual(resolve('/.well-known/x'), 'https://example.gov.np/.well-known/x')
+
+
+class URLBatcherTestCase(TestCase):
+    def test_url_batcher_coalesces_concurrent_urls(self):
+        """
+        Test that URLs requested concurrently are processed in one batch, each URL only once.
+        """
+        batches = []
+
+        async def process_batch(urls):
+            batches.append(urls)
+            return {url: {url: []} for url in urls}
+
+        async def scrape():
+            batcher = URLBatcher(process_batch)
+            return await asyncio.gather(
+                batcher.process('https://a.gov.np/'),
+                batcher.process('https://b.gov.np/'),
+                batcher.process('https://a.gov.np/'),
+            )
+
+        results = asyncio.run(scrape())
+        self.assertEqual(batches, [['https://a.gov.np/', 'https://b.gov.np/']])
+        self.assertEqual(results, [{'https://a.gov.np/': []}, {'https://b.gov.np/': []}, {'https://a.gov.np/': []}])
+
+    def test_url_batcher_keeps_event_loops_apart(self):
+        """
+        Test that URLs processed concurrently on different event loops (as under WSGI) are batched per loop.
+        """
+        batches = []
+        results = {}
+        barrier = threading.Barrier(2)
+
+        async def process_batch(urls):
+            batches.append(urls)
+            return {url: {url: []} for url in urls}
+
+        batcher = URLBatcher(process_batch, max_queue_time=0.2)
+
+        async def scrape(url):
+            barrier.wait()
+            return await batcher.process(url)
+
+        def run(url):
+            results[url] = asyncio.run(scrape(url))
+
+        threads = [threading.Thread(target=run, args=(url,)) for url in ('https://a.gov.np/', 'https://b.gov.np/')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertCountEqual(batches, [['https://a.gov.np/'], ['https://b.gov.np/']])
+        self.assertEqual(results, {'https://a.gov.np/': {'https://a.gov.np/': []}, 'https://b.gov.np/': {'https://b.gov.np/': []}})
+
+
+class CachedPagesTestCase(TestCase):
+    """
+    Base class for tests that scrape pages offline by serving them from a temporary response cache.
+    """
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        patcher = mock.patch.object(utils, 'CACHE_PATH', Path(cache_dir.name) / 'cache.sqlite')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class ResponseCacheTestCase(CachedPagesTestCase):
+    def test_cache_round_trip(self):
+        """
+        Test that cached pages are returned until they expire.
+        """
+        utils._cache_set('https://example.gov.np/', b'<p>page</p>', 'utf-8')
+        self.assertEqual(utils._cache_get('https://example.gov.np/'), (b'<p>page</p>', 'utf-8'))
+        self.assertIsNone(utils._cache_get('https://other.gov.np/'))
+
+        with mock.patch.object(utils.time, 'time', return_value=utils.time.time() + utils.CACHE_EXPIRE_AFTER + 1):
+            self.assertIsNone(utils._cache_get('https://example.gov.np/'))
+
+    def test_cache_lifetime_follows_cache_control(self):
+        """
+        Test that the Cache-Control header decides whether and for how long a page is cached.
+        """
+        self.assertEqual(utils._cache_lifetime(''), utils.CACHE_EXPIRE_AFTER)
+        self.assertEqual(utils._cache_lifetime('public, max-age=60'), 60)
+        self.assertEqual(utils._cache_lifetime('max-age=86400'), utils.CACHE_EXPIRE_AFTER)
+        for cache_control in ('no-store', 'no-cache', 'private, max-age=60', 'max-age=0', 'max-age=soon'):
+            self.assertEqual(utils._cache_lifetime(cache_control), 0, cache_control)
+
+    def test_get_html_uses_cache(self):
+        """
+        Test that get_html serves a cached page without going to the network.
+        """
+        url = 'http://127.0.0.1:9/'  # Nothing listens on the discard port
+        utils._cache_set(url, b'<p>page</p>', 'utf-8', 60)
+        self.assertEqual(get_html(url), {'url': url, 'error': None, 'html': b'<p>page</p>', 'encoding': 'utf-8'})
+
+    def test_extract_data_from_urls_uses_cache(self):
+        """
+        Test that a cached page is scraped without going to the network.
+        """
+        url = 'http://127.0.0.1:9/'  # Nothing listens on the discard port
+        utils._cache_set(url, b'<div id="block-menu-menu-egov-services"><a href="/tax">Tax</a></div>', None)
+        self.assertEqual(extract_data_from_urls([url]), [
+            {url: [{'service_name': 'Tax', 'link_of_service': 'http://127.0.0.1:9/tax'}]},
+        ])
+
+
+class GetHtmlTestCase(CachedPagesTestCase):
+    def test_get_html_reuses_connections(self):
+        """
+        Test that repeated requests to a host go over one pooled keep-alive connection. The page is
+        marked `no-cache`, so both requests reach the server.
+        """
+        peers = []
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                peers.append(self.client_address)
+                body = b'<p>page</p>'
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        url = 'http://127.0.0.1:%d/' % server.server_port
+        for _ in range(2):
+            self.assertEqual(get_html(url), {'url': url, 'error': None, 'html': b'<p>page</p>', 'encoding': 'utf-8'})
+        self.assertEqual(len(peers), 2)
+        self.assertEqual(peers[0], peers[1])
+
+
+class FailedURLTestCase(TestCase):
+    def test_failed_url_does_not_fail_the_others(self):
+        """
+        Test that an unexpected error for one URL is reported for that URL only.
+        """
+        async def fetch(session, sem, url):
+            if url.endswith('/broken'):
+                raise ValueError(url)
+            html = b'<div id="block-menu-menu-egov-services"><a href="/tax">Tax</a></div>'
+            return {'url': url, 'error': None, 'html': html, 'encoding': None}
+
+        with mock.patch.object(utils, '_fetch', side_effect=fetch):
+            results = extract_data_from_urls(['https://a.gov.np/broken', 'https://a.gov.np/'])
+        self.assertEqual(results, [
+            {'https://a.gov.np/broken': {'error': 'ValueError'}},
+            {'https://a.gov.np/': [{'service_name': 'Tax', 'link_of_service': 'https://a.gov.np/tax'}]},
+        ])
+
+
+class ParsePoolTestCase(CachedPagesTestCase):
+    def test_broken_parse_pool_is_replaced(self):
+        """
+        Test that scraping recovers after a parse worker dies and breaks the pool.
+        """
+        pool = utils._get_parse_pool()
+        with self.assertRaises(BrokenProcessPool):
+            pool.submit(os._exit, 1).result()
+
+        url = 'http://127.0.0.1:9/'
+        utils._cache_set(url, b'<div id="block-menu-menu-egov-services"><a href="/tax">Tax</a></div>', None)
+        self.assertEqual(extract_data_from_urls([url]), [
+            {url: [{'service_name': 'Tax', 'link_of_service': 'http://127.0.0.1:9/tax'}]},
+        ])
+        self.assertIsNot(utils._get_parse_pool(), pool)
+
+    def test_pages_are_transcoded_in_the_pool(self):
+        """
+        Test that a page in a charset libxml2 can't decode is scraped through the parse pool.
+        """
+        url = 'http://127.0.0.1:9/'
+        html = '<meta charset="mac-roman"><div id="block-menu-menu-egov-services"><a href="/café">Café</a></div>'
+        utils._cache_set(url, html.encode('mac-roman'), None)
+        self.assertEqual(extract_data_from_urls([url]), [
+            {url: [{'service_name': 'Café', 'link_of_service': 'http://127.0.0.1:9/café'}]},
+        ])
+
+
+class ScraperAPIViewTestCase(CachedPagesTestCase):
+    def test_invalid_url_is_rejected(self):
+        """
+        Test that an invalid URL is reported as a validation error keyed by its index.
+        """
+        response = self.client.post('/api/scrape/', {'urls': ['not a url']}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'urls': {'0': ['Enter a valid URL.']}})
+
+    def test_scrape_under_wsgi_closes_session(self):
+        """
+        Test that a scrape through the WSGI handler closes the session of its throwaway event loop.
+        """
+        url = 'http://127.0.0.1:9/'  # Nothing listens on the discard port
+        utils._cache_set(url, b'<div id="block-menu-menu-egov-services"><a href="/tax">Tax</a></div>', None)
+        response = self.client.post('/api/scrape/', {'urls': [url]}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [{url: [{'service_name': 'Tax', 'link_of_service': 'http://127.0.0.1:9/tax'}]}])
+        self.assertEqual(utils._SESSIONS, {})
+
+    def test_scrape_under_asgi_keeps_session(self):
+        """
+        Test that a scrape through the ASGI handler leaves the session of the server's event loop open for reuse.
+        """
+        url = 'http://127.0.0.1:9/'
+        utils._cache_set(url, b'<div id="block-menu-menu-egov-services"><a href="/tax">Tax</a></div>', None)
+
+        async def scrape():
+            try:
+                response = await AsyncClient().post('/api/scrape/', {'urls': [url]}, content_type='application/json')
+                return response, asyncio.get_running_loop() in utils._SESSIONS
+            finally:
+                await utils.close_session()
+
+        response, session_kept = asyncio.run(scrape())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [{url: [{'service_name': 'Tax', 'link_of_service': 'http://127.0.0.1:9/tax'}]}])
+        self.assertTrue(session_kept)
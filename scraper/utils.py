@@ -1,29 +1,145 @@
+import asyncio
+import atexit
+import functools
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import aiohttp
 import requests
-from bs4 import BeautifulSoup
-from typing import List, Dict, Any
-from concurrent.futures import ThreadPoolExecutor
-from urllib.parse import urljoin
+from asgiref.sync import AsyncToSync
+from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import lxml.html
+from lxml import etree
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager, closing
+from typing import List, Dict, Any, AsyncIterator, Awaitable, Callable, Iterable, Optional, Set, Tuple, Union
+from urllib.parse import urljoin, urlsplit
 import re
 
-def normalize_url(url: str, base_url: str) -> str:
+SERVICES_BLOCK_ID = 'block-menu-menu-egov-services'
+
+# Link text of the eGovernance services menu entry on sites without the services block.
+_SERVICE_TEXT_PATTERN = 'विधुतीय|विद्युतीय'
+
+# Service links in a single pass over the document: every link inside the services block
+# or, only when that block is missing, every link in the list item of the first anchor
+# whose text matches `_SERVICE_TEXT_PATTERN`.
+_SERVICE_LINKS_XPATH = etree.XPath(
+    "(//div[@id=$block_id])[1]//a[@href]"
+    " | (//a[re:test(string(.), $pattern, 'i')])[1][not(//div[@id=$block_id])]/ancestor::li[1]//a[@href]",
+    namespaces={'re': 'http://exslt.org/regular-expressions'},
+)
+_BLOCK_LINKS_XPATH = etree.XPath('//a[@href]')
+_TEXT_NODES_XPATH = etree.XPath('.//text()')
+
+# Opening tag of the services block, and any div tag, for slicing the block out of the raw HTML.
+_SERVICES_BLOCK_RE = re.compile(rb'<div\b[^>]*\sid\s*=\s*["\']?%s["\'\s>]' % re.escape(SERVICES_BLOCK_ID.encode()), re.IGNORECASE)
+_DIV_TAG_RE = re.compile(rb'<(/?)div\b[^>]*>', re.IGNORECASE)
+
+# Charset declared in a <meta> tag, looked for in the first `_META_SNIFF_BYTES` of a page.
+_META_CHARSET_RE = re.compile(rb'<meta\b[^>]*charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+_META_SNIFF_BYTES = 65536
+
+# lxml parsers are not thread-safe, so each thread reuses its own instances (one per encoding).
+_PARSER_LOCAL = threading.local()
+
+# Upper bound on how much of a response body is read. The services menu sits near the
+# top of the page, so anything past this is never needed.
+MAX_BYTES = 2_000_000
+CHUNK_SIZE = 8192
+
+DEFAULT_HEADERS = {'Accept-Encoding': 'gzip, deflate'}
+
+# Cap on the aiohttp connector's connections to any one host, matching what browsers open,
+# so a batch of same-host URLs doesn't flood the server.
+MAX_CONNECTIONS_PER_HOST = 6
+
+# Upper bound on the number of requests in flight at once for a single batch.
+MAX_WORKERS = 64
+
+# Pages fetched by `get_html` and `_fetch` are cached on disk for up to an hour, as their
+# Cache-Control header allows, so repeated scrapes of the same URLs are served from SQLite
+# instead of the network. Only the capped body is stored.
+CACHE_PATH = Path(__file__).resolve().parent.parent / '.scrape_cache.sqlite'
+CACHE_EXPIRE_AFTER = 3600
+
+# Cache databases whose table has already been created, so the schema is only set up once.
+_CACHE_SCHEMA_PATHS: Set[Path] = set()
+
+# Shared requests session for `get_html`, so repeated requests to the same host reuse
+# keep-alive connections instead of paying for a new TCP/TLS handshake each time.
+_HTTP_SESSION = requests.Session()
+_HTTP_ADAPTER = HTTPAdapter(
+    pool_connections=20,
+    pool_maxsize=100,
+    max_retries=Retry(total=2, connect=2, read=1, backoff_factor=0.3, status_forcelist=(502, 503, 504)),
+)
+_HTTP_SESSION.mount('https://', _HTTP_ADAPTER)
+_HTTP_SESSION.mount('http://', _HTTP_ADAPTER)
+
+# Shared aiohttp sessions and their DNS resolvers, one pair per event loop since both are bound
+# to the loop they were created on. They are created lazily and must be closed with
+# `close_session`, which removes them from here.
+_SESSIONS: Dict[asyncio.AbstractEventLoop, Tuple[aiohttp.ClientSession, aiohttp.AsyncResolver]] = {}
+
+# Worker processes for parsing pages fetched by the async path, created lazily so that
+# importing this module does not spawn processes.
+_PARSE_POOL: Optional[ProcessPoolExecutor] = None
+
+def url_resolver(base_url: str) -> Callable[[str], str]:
     """
-    Normalizes a URL by combining a base URL with a relative URL.
+    Builds a function that resolves URLs found on a page into normalized absolute URLs.
 
-    This function takes a relative URL and a base URL, then combines them into an absolute URL using 
-    `urljoin` from the `urllib.parse` module. It ensures that the final URL is properly formatted and 
-    handles edge cases such as trailing slashes or incomplete URLs. The resulting URL will have no trailing 
-    slash to maintain consistency.
+    The base URL is parsed once, so that all the links of a page can be resolved without re-parsing it.
+    Absolute URLs and plain root-relative paths (the common cases) are handled directly; anything
+    else is combined with the base URL using `urljoin` from the `urllib.parse` module. The resulting
+    URLs will have no trailing slash to maintain consistency.
 
     Args:
-        url (str): The relative or absolute URL to normalize. This can be a full URL or a path that needs
-                   to be joined with the base URL.
-        base_url (str): The base URL used to resolve the relative URL. This is typically the URL of the 
+        base_url (str): The base URL used to resolve relative URLs. This is typically the URL of the
                         current page or site.
 
     Returns:
-        str: The normalized absolute URL, combining the base URL and the provided URL.
+        Callable[[str], str]: A function that takes a relative or absolute URL and returns the normalized
+        absolute URL.
     """
-    return urljoin(base_url.rstrip('/'), url).rstrip('/')
+    base_url = base_url.rstrip('/')
+    base_parts = urlsplit(base_url)
+    base_root = f"{base_parts.scheme}://{base_parts.netloc}"
+
+    def resolve(url: str) -> str:
+        if url.startswith(('http://', 'https://')):
+            return url.rstrip('/')
+        # Paths with dot segments (e.g. `/a/../b`) are left to `urljoin`, which removes them
+        if url.startswith('/') and not url.startswith('//') and '/.' not in url:
+            return base_root + url.rstrip('/')
+        return urljoin(base_url, url).rstrip('/')
+
+    return resolve
+
+def _read_limited(chunks: Iterable[bytes], limit: int = MAX_BYTES) -> bytes:
+    """
+    Reads chunks from a streamed response body, stopping once `limit` bytes have been read.
+
+    Args:
+        chunks (Iterable[bytes]): The body chunks, e.g. from `Response.iter_content`.
+        limit (int, optional): The maximum number of bytes to return. Defaults to `MAX_BYTES`.
+
+    Returns:
+        bytes: At most `limit` bytes of the body.
+    """
+    body = bytearray()
+    for chunk in chunks:
+        body += chunk
+        if len(body) >= limit:
+            break
+    return bytes(body[:limit])
 
 def get_html(url: str) -> Dict[str, Any]:
     """
@@ -32,7 +148,9 @@ def get_html(url: str) -> Dict[str, Any]:
     This function makes an HTTP GET request to the specified URL and attempts to retrieve the HTML content. 
     It handles exceptions that may occur during the request (e.g., network errors, invalid URLs, or timeouts) 
     and ensures that the function does not crash. In case of an error, the function returns an error message 
-    with the exception type. If the request is successful, the HTML content is returned.
+    with the exception type. If the request is successful, the HTML content is returned as bytes, leaving
+    decoding to the parser. The body is streamed and only its first `MAX_BYTES` bytes are read. Pages
+    are served from the on-disk cache when possible (see `_cache_lifetime`).
 
     Args:
         url (str): The URL from which to fetch the HTML content. It should be a valid, accessible URL.
@@ -41,30 +159,158 @@ def get_html(url: str) -> Dict[str, Any]:
         Dict[str, Any]: A dictionary containing:
             - 'url' (str): The URL that was requested.
             - 'error' (str or None): The type of error (if any), or None if the request was successful.
-            - 'html' (str or None): The HTML content of the page, or None if the request failed.
+            - 'html' (bytes or None): The raw HTML content of the page, or None if the request failed.
+            - 'encoding' (str or None): The charset declared in the Content-Type header, if any.
 
     """
-    response = {'url': url, 'error': None, 'html': None}
+    response = {'url': url, 'error': None, 'html': None, 'encoding': None}
+    cached = _cache_get(url)
+    if cached is not None:
+        response['html'], response['encoding'] = cached
+        return response
+
     try:
-        with requests.get(url, timeout=10) as res:
+        with _HTTP_SESSION.get(url, timeout=10, stream=True, headers=DEFAULT_HEADERS) as res:
             res.raise_for_status()
-            response['html'] = res.text
+            response['html'] = _read_limited(res.iter_content(CHUNK_SIZE))
+            if 'charset' in res.headers.get('Content-Type', '').lower():
+                response['encoding'] = res.encoding
+            lifetime = _cache_lifetime(res.headers.get('Cache-Control', ''))
     except requests.RequestException as e:
         response['error'] = type(e).__name__
+        return response
+
+    if lifetime:
+        _cache_set(url, response['html'], response['encoding'], lifetime)
     return response
 
-def parse_html(base_url: str, html: str) -> List[Dict[str, Any]]:
+def _get_html_parser(encoding: str) -> lxml.html.HTMLParser:
+    """
+    Returns the HTML parser of the current thread for the given encoding, creating it on first use.
+
+    Reusing one parser avoids setting up libxml2's parser context for every page.
+
+    Args:
+        encoding (str): The encoding the parser decodes its input with. It must be supported by
+            libxml2 (see `_lxml_supports_encoding`).
+
+    Returns:
+        lxml.html.HTMLParser: A recovering HTML parser for `encoding`.
+    """
+    parsers = getattr(_PARSER_LOCAL, 'parsers', None)
+    if parsers is None:
+        parsers = _PARSER_LOCAL.parsers = {}
+    parser = parsers.get(encoding)
+    if parser is None:
+        parser = parsers[encoding] = lxml.html.HTMLParser(recover=True, huge_tree=False, encoding=encoding)
+    return parser
+
+@functools.lru_cache(maxsize=None)
+def _lxml_supports_encoding(encoding: str) -> bool:
+    """
+    Checks whether libxml2 can decode the given encoding. It accepts most charset labels used in
+    HTML, but not every name Python's codecs know (e.g. `mac-roman`).
+
+    Args:
+        encoding (str): The charset label.
+
+    Returns:
+        bool: True if an lxml parser can be created for `encoding`.
+    """
+    try:
+        lxml.html.HTMLParser(encoding=encoding)
+    except LookupError:
+        return False
+    return True
+
+def _declared_encoding(html: bytes, declared: Optional[str] = None) -> Optional[str]:
+    """
+    Determines the charset of a page, from its Content-Type charset or its <meta> charset.
+
+    Args:
+        html (bytes): The raw HTML content of the page.
+        declared (Optional[str], optional): The charset from the Content-Type header, if any.
+
+    Returns:
+        Optional[str]: The lowercased charset label, or None if the page doesn't declare one.
+    """
+    if not declared:
+        match = _META_CHARSET_RE.search(html, 0, _META_SNIFF_BYTES)
+        declared = match.group(1).decode('ascii') if match else None
+    return declared.strip().lower() if declared else None
+
+def _prepare_html(html: bytes, encoding: Optional[str]) -> Tuple[bytes, str]:
+    """
+    Makes raw HTML parseable by lxml.
+
+    The charset label is passed to lxml as is. Encodings libxml2 can't handle but Python can are
+    transcoded to UTF-8 here; markup without a usable charset is parsed as UTF-8.
+
+    Args:
+        html (bytes): The raw HTML content.
+        encoding (Optional[str]): The charset label found by `_declared_encoding`, if any.
+
+    Returns:
+        Tuple[bytes, str]: The raw HTML content, possibly transcoded, and an encoding lxml can parse it with.
+    """
+    if not encoding:
+        return html, 'utf-8'
+    if _lxml_supports_encoding(encoding):
+        return html, encoding
+    try:
+        return html.decode(encoding, errors='replace').encode('utf-8'), 'utf-8'
+    except LookupError:
+        return html, 'utf-8'
+
+def _services_block(html: bytes) -> Optional[bytes]:
+    """
+    Slices the services block out of the raw HTML without parsing the whole document.
+
+    The opening tag is located with a regex, then div tags are counted from there until the
+    matching closing tag is found.
+
+    Args:
+        html (bytes): The raw HTML content of the page.
+
+    Returns:
+        Optional[bytes]: The markup of the services block, or None if the page has no block or
+        it is not properly closed.
+    """
+    match = _SERVICES_BLOCK_RE.search(html)
+    if not match:
+        return None
+    depth = 0
+    for tag in _DIV_TAG_RE.finditer(html, match.start()):
+        depth += -1 if tag.group(1) else 1
+        if depth == 0:
+            return html[match.start():tag.end()]
+    return None
+
+def _link_text(link: lxml.html.HtmlElement) -> str:
+    """
+    Returns the text of a link with each text node stripped, the same as BeautifulSoup's
+    `get_text(strip=True)`.
+    """
+    return ''.join(text.strip() for text in _TEXT_NODES_XPATH(link))
+
+def parse_html(base_url: str, html: Union[str, bytes], encoding: Optional[str] = None) -> List[Dict[str, Any]]:
     """
     Parses the HTML content to extract service names and corresponding links.
 
     This function takes the HTML content of a page and searches for specific sections 
-    related to services. It looks for a div with a specific ID and searches for links
-    containing certain keywords. The function returns a list of dictionaries where each
-    dictionary contains the name of the service and its associated link.
+    related to services. It looks for a div with a specific ID and, if there is none, for a
+    link containing certain keywords. When the div is present, only its markup is sliced out
+    and parsed; otherwise both lookups are done by one compiled XPath query over the whole
+    document. Raw bytes are decoded by lxml itself, using the declared encoding. The function
+    returns a list of dictionaries where each dictionary contains the name of the service and
+    its associated link.
 
     Args:
         base_url (str): The base URL used to normalize relative URLs in the HTML content.
-        html (str): The raw HTML content of the page to parse.
+        html (str or bytes): The HTML content of the page to parse, either decoded or as raw bytes.
+        encoding (Optional[str], optional): The charset from the Content-Type header, if any. Used for
+            raw bytes only; when it is missing the page's <meta> charset is used, then UTF-8. Unknown
+            charsets are treated as UTF-8.
 
     Returns:
         List[Dict[str, Any]]: A list of dictionaries, each containing:
@@ -74,35 +320,65 @@ def parse_html(base_url: str, html: str) -> List[Dict[str, Any]]:
     """
     if not html:
         return []
-    
-    soup = BeautifulSoup(html, 'html.parser')
-    
-    # Combined search for services div using a list of selectors
-    selectors = [
-        lambda s: s.find('div', id='block-menu-menu-egov-services'),
-        lambda s: s.find('a', text=re.compile('विधुतीय|विद्युतीय', re.IGNORECASE))
-    ]
-    
-    services_div = None
-    for selector in selectors:
-        services_div = selector(soup)
-        if services_div:
-            break
-    
-    if not services_div:
+    return _parse_services(base_url, *_select_markup(html, encoding))
+
+def _select_markup(html: Union[str, bytes], encoding: Optional[str] = None) -> Tuple[bytes, Optional[str], bool]:
+    """
+    Picks the markup of a page to parse: only the services block if the page has one (the fast
+    path, since most sites do), otherwise the whole document.
+
+    This only scans the raw bytes and leaves any transcoding to `_parse_services`, so it is cheap
+    enough to run on the event loop.
+
+    Args:
+        html (str or bytes): The HTML content of the page, either decoded or as raw bytes.
+        encoding (Optional[str], optional): The charset from the Content-Type header, if any.
+
+    Returns:
+        Tuple[bytes, Optional[str], bool]: The markup, the charset of the page if it declares one, and
+        whether the markup is the services block.
+    """
+    if isinstance(html, str):
+        html, encoding = html.encode('utf-8'), 'utf-8'
+    else:
+        encoding = _declared_encoding(html, encoding)
+
+    block = _services_block(html)
+    if block is not None:
+        return block, encoding, True
+    return html, encoding, False
+
+def _parse_services(base_url: str, markup: bytes, encoding: Optional[str], is_block: bool) -> List[Dict[str, Any]]:
+    """
+    Parses markup selected by `_select_markup` and extracts the service links from it.
+
+    Args:
+        base_url (str): The base URL used to normalize relative URLs.
+        markup (bytes): The services block, or the whole document.
+        encoding (Optional[str]): The charset of the page, if it declares one.
+        is_block (bool): Whether `markup` is the services block.
+
+    Returns:
+        List[Dict[str, Any]]: The services, in the format returned by `parse_html`.
+    """
+    markup, encoding = _prepare_html(markup, encoding)
+    tree = etree.fromstring(markup, _get_html_parser(encoding))
+    if tree is None:
         return []
-    
-    if services_div.name == 'a':
-        services_div = services_div.find_parent('li')
-    
-    return [
-        {
-            'service_name': link.get_text(strip=True),
-            'link_of_service': normalize_url(link['href'].strip(), base_url)
-        }
-        for link in services_div.find_all('a', href=True)
-        if link.get_text(strip=True) and link['href'].strip()
-    ]
+
+    if is_block:
+        links = _BLOCK_LINKS_XPATH(tree)
+    else:
+        links = _SERVICE_LINKS_XPATH(tree, block_id=SERVICES_BLOCK_ID, pattern=_SERVICE_TEXT_PATTERN)
+
+    resolve_url = url_resolver(base_url)
+    services = []
+    for link in links:
+        text = _link_text(link)
+        href = link.get('href').strip()
+        if text and href:
+            services.append({'service_name': text, 'link_of_service': resolve_url(href)})
+    return services
 
 def process_url(url: str) -> Dict[str, Any]:
     """
@@ -124,31 +400,473 @@ def process_url(url: str) -> Dict[str, Any]:
     response = get_html(url)
     if response['error']:
         return {url: {'error': response['error']}}
-    return {url: parse_html(url, response['html'])}
+    return {url: parse_html(url, response['html'], response['encoding'])}
+
+async def _get_session() -> aiohttp.ClientSession:
+    """
+    Returns the shared aiohttp session of the running event loop, creating it on first use.
+
+    The session owns a pooled `TCPConnector`, so connections are reused across requests. DNS lookups
+    go through aiodns instead of blocking `getaddrinfo` calls in the default thread pool, are limited
+    to IPv4 addresses and are cached for five minutes. Under ASGI there is a single loop, so the session
+    lives for the whole process; under WSGI, Django runs each async view on its own loop, so callers
+    must close the session before that loop goes away (see `session_scope`).
+
+    Returns:
+        aiohttp.ClientSession: The session bound to the currently running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    entry = _SESSIONS.get(loop)
+    if entry is not None and not entry[0].closed:
+        return entry[0]
 
-def extract_data_from_urls(urls: List[str], max_workers: int = 5) -> List[Dict[str, Any]]:
+    # The connector doesn't close a resolver it was given, so it is kept to be closed with the session.
+    resolver = aiohttp.AsyncResolver()
+    connector = aiohttp.TCPConnector(
+        limit=100,
+        limit_per_host=MAX_CONNECTIONS_PER_HOST,
+        use_dns_cache=True,
+        ttl_dns_cache=300,
+        family=socket.AF_INET,
+        resolver=resolver,
+    )
+    session = aiohttp.ClientSession(connector=connector, headers=DEFAULT_HEADERS)
+    _SESSIONS[loop] = (session, resolver)
+    return session
 
+def _get_parse_pool() -> ProcessPoolExecutor:
     """
-    Extracts data from a list of URLs concurrently using parallel processing.
+    Returns the shared process pool used to parse HTML, creating it on first use.
 
-    This function takes a list of URLs and uses a thread pool to fetch and process each URL in parallel.
-    The processing of each URL is handled by the `process_url` function, which is expected to return
-    a dictionary containing the extracted data from the page. By using parallelism with threads, this
-    function can significantly speed up the extraction process, especially when working with a large number
-    of URLs.
+    Workers are spawned rather than forked: the pool is created lazily from a process that is
+    already running an event loop and helper threads (e.g. `asyncio.to_thread` workers), whose
+    state a forked child would inherit half-copied.
+
+    Returns:
+        ProcessPoolExecutor: A pool with one worker per CPU.
+    """
+    global _PARSE_POOL
+    if _PARSE_POOL is None:
+        _PARSE_POOL = ProcessPoolExecutor(
+            max_workers=os.cpu_count(), mp_context=multiprocessing.get_context('spawn')
+        )
+    return _PARSE_POOL
+
+def _discard_parse_pool(pool: ProcessPoolExecutor) -> None:
+    """
+    Shuts down a parse pool and, if it is the shared one, lets `_get_parse_pool` create a new one.
+
+    Args:
+        pool (ProcessPoolExecutor): The pool to discard, e.g. because a worker died and broke it.
+    """
+    global _PARSE_POOL
+    if _PARSE_POOL is pool:
+        _PARSE_POOL = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+@atexit.register
+def _shutdown_parse_pool() -> None:
+    """
+    Stops the worker processes of the shared parse pool when the interpreter exits.
+    """
+    if _PARSE_POOL is not None:
+        _discard_parse_pool(_PARSE_POOL)
+
+async def close_session() -> None:
+    """
+    Closes the shared aiohttp session of the running event loop and its DNS resolver, if it has one.
+    """
+    entry = _SESSIONS.pop(asyncio.get_running_loop(), None)
+    if entry is not None:
+        session, resolver = entry
+        await session.close()
+        await resolver.close()
+
+@asynccontextmanager
+async def session_scope() -> AsyncIterator[None]:
+    """
+    Closes the session of the running event loop on exit if that loop won't outlive the caller.
+
+    Under ASGI the server's loop runs for the whole process, so its session is left open and reused
+    by later requests. Under WSGI, Django runs each async view through asgiref's `async_to_sync`,
+    which makes a new loop for the call and throws it away afterwards; the session of such a loop
+    would leak, so it is closed when the view is done with it.
+    """
+    try:
+        yield
+    finally:
+        # asgiref keeps the loops it made for a single call here until the call returns
+        if asyncio.get_running_loop() in AsyncToSync.loop_thread_executors:
+            await close_session()
+
+def _cache_connect() -> sqlite3.Connection:
+    """
+    Opens the response cache, creating its table the first time the database is opened.
+
+    Returns:
+        sqlite3.Connection: A connection to the SQLite database at `CACHE_PATH`.
+    """
+    connection = sqlite3.connect(CACHE_PATH)
+    if CACHE_PATH not in _CACHE_SCHEMA_PATHS:
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS responses '
+            '(url TEXT PRIMARY KEY, html BLOB NOT NULL, encoding TEXT, expires REAL NOT NULL)'
+        )
+        _CACHE_SCHEMA_PATHS.add(CACHE_PATH)
+    return connection
+
+def _cache_lifetime(cache_control: str) -> int:
+    """
+    Works out how long a response may be cached from its Cache-Control header.
+
+    Responses marked `no-store`, `no-cache` or `private` are not cached. Otherwise they are kept
+    for their `max-age`, capped at `CACHE_EXPIRE_AFTER`, or for `CACHE_EXPIRE_AFTER` if they have none.
+
+    Args:
+        cache_control (str): The value of the Cache-Control header, possibly empty.
+
+    Returns:
+        int: The number of seconds the response may be cached for; 0 if it must not be cached.
+    """
+    directives = {}
+    for directive in cache_control.lower().split(','):
+        name, _, value = directive.partition('=')
+        directives[name.strip()] = value.strip().strip('"')
+    if directives.keys() & {'no-store', 'no-cache', 'private'}:
+        return 0
+    if 'max-age' not in directives:
+        return CACHE_EXPIRE_AFTER
+    try:
+        return max(0, min(int(directives['max-age']), CACHE_EXPIRE_AFTER))
+    except ValueError:
+        return 0
+
+def _cache_get(url: str) -> Optional[Tuple[bytes, Optional[str]]]:
+    """
+    Looks up a cached page that has not expired yet.
+
+    Args:
+        url (str): The URL of the page.
+
+    Returns:
+        Optional[Tuple[bytes, Optional[str]]]: The raw HTML and the Content-Type charset of the page,
+        or None if it is not cached or the cache can't be read.
+    """
+    try:
+        with closing(_cache_connect()) as connection:
+            return connection.execute(
+                'SELECT html, encoding FROM responses WHERE url = ? AND expires > ?', (url, time.time())
+            ).fetchone()
+    except sqlite3.Error:
+        return None
+
+def _cache_set(url: str, html: bytes, encoding: Optional[str], lifetime: int = CACHE_EXPIRE_AFTER) -> None:
+    """
+    Stores a page in the cache for `lifetime` seconds. Failures are ignored, since the cache is
+    only an optimization.
+
+    Args:
+        url (str): The URL of the page.
+        html (bytes): The raw HTML content of the page.
+        encoding (Optional[str]): The charset declared in the Content-Type header, if any.
+        lifetime (int, optional): How long the page stays cached, in seconds. Defaults to `CACHE_EXPIRE_AFTER`.
+    """
+    try:
+        with closing(_cache_connect()) as connection, connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)',
+                (url, html, encoding, time.time() + lifetime),
+            )
+    except sqlite3.Error:
+        pass
+
+async def _fetch(session: aiohttp.ClientSession, sem: asyncio.Semaphore, url: str) -> Dict[str, Any]:
+    """
+    Asynchronously fetches the HTML content of a given URL.
+
+    This is the non-blocking counterpart of `get_html` and returns a dictionary of the same shape.
+    The semaphore bounds how many requests are in flight at once; connections to the URL's host
+    are capped by the session's connector (see `MAX_CONNECTIONS_PER_HOST`). The body is streamed
+    and only its first `MAX_BYTES` bytes are read; it is returned as bytes, leaving decoding to the
+    parser. Pages are served from the on-disk cache when possible, and successful responses are
+    cached for as long as their Cache-Control header allows (see `_cache_lifetime`).
+
+    Args:
+        session (aiohttp.ClientSession): The session used to issue the request.
+        sem (asyncio.Semaphore): Semaphore limiting the number of concurrent requests.
+        url (str): The URL from which to fetch the HTML content.
+
+    Returns:
+        Dict[str, Any]: A dictionary containing:
+            - 'url' (str): The URL that was requested.
+            - 'error' (str or None): The type of error (if any), or None if the request was successful.
+            - 'html' (bytes or None): The raw HTML content of the page, or None if the request failed.
+            - 'encoding' (str or None): The charset declared in the Content-Type header, if any.
+    """
+    response = {'url': url, 'error': None, 'html': None, 'encoding': None}
+    cached = await asyncio.to_thread(_cache_get, url)
+    if cached is not None:
+        response['html'], response['encoding'] = cached
+        return response
+
+    try:
+        async with sem, session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as res:
+            res.raise_for_status()
+            body = bytearray()
+            async for chunk in res.content.iter_chunked(CHUNK_SIZE):
+                body += chunk
+                if len(body) >= MAX_BYTES:
+                    break
+            response['html'] = bytes(body[:MAX_BYTES])
+            response['encoding'] = res.charset
+            lifetime = _cache_lifetime(res.headers.get('Cache-Control', ''))
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        response['error'] = type(e).__name__
+        return response
+
+    if lifetime:
+        await asyncio.to_thread(_cache_set, url, response['html'], response['encoding'], lifetime)
+    return response
+
+async def _fetch_and_parse(session: aiohttp.ClientSession, sem: asyncio.Semaphore, url: str) -> Dict[str, Any]:
+    """
+    Asynchronously fetches a single URL and parses its HTML content.
+
+    Parsing is CPU-bound, so it is handed to the shared process pool instead of running on the
+    event loop, where it would hold up the other fetches. The services block is sliced out first,
+    so for most pages only that small part of the document is sent to the worker, which also
+    transcodes it if libxml2 can't decode its charset. If the pool is broken (e.g. a worker was killed), it is replaced and the page is parsed once more. Any other
+    failure is reported as an error for this URL instead of being raised.
+
+    Args:
+        session (aiohttp.ClientSession): The session used to issue the request.
+        sem (asyncio.Semaphore): Semaphore limiting the number of concurrent requests.
+        url (str): The URL to fetch and process.
+
+    Returns:
+        Dict[str, Any]: A dictionary with the URL as the key. The value is either:
+            - An error message if there was an issue fetching or parsing the page (e.g., network error, invalid URL).
+            - The processed data extracted from the HTML page, as returned by the `parse_html` function.
+    """
+    try:
+        response = await _fetch(session, sem, url)
+        if response['error']:
+            return {url: {'error': response['error']}}
+        if not response['html']:
+            return {url: []}
+
+        loop = asyncio.get_running_loop()
+        markup = _select_markup(response['html'], response['encoding'])
+        for attempt in range(2):
+            pool = _get_parse_pool()
+            try:
+                services = await loop.run_in_executor(pool, _parse_services, url, *markup)
+            except BrokenProcessPool:
+                _discard_parse_pool(pool)
+                if attempt:
+                    raise
+            else:
+                return {url: services}
+    except Exception as e:
+        # Report the failure for this URL only, so it doesn't fail the rest of its batch
+        return {url: {'error': type(e).__name__}}
+
+def default_max_workers(urls: List[str]) -> int:
+    """
+    Picks how many requests to run concurrently for a batch of URLs.
+
+    Scraping is I/O-bound, so the limit doesn't depend on the CPU count: every URL of a small batch
+    is fetched at once, while large batches are capped at `MAX_WORKERS`. Connections to any one host
+    are still limited by `MAX_CONNECTIONS_PER_HOST`.
+
+    Args:
+        urls (List[str]): The URLs of the batch.
+
+    Returns:
+        int: The maximum number of concurrent requests, at least 1.
+    """
+    return max(1, min(len(urls), MAX_WORKERS))
+
+async def iter_data_from_urls(urls: List[str], max_workers: Optional[int] = None) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Extracts data from a list of URLs concurrently, yielding each result as soon as it is ready.
+
+    All URLs are fetched on a single event loop through the shared aiohttp session, with at most
+    `max_workers` requests in flight at a time. Each page is parsed in a worker process as soon as it
+    has been downloaded. Results are yielded in completion order, so callers
+    can start using them before the slowest URL has finished.
+
+    Args:
+        urls (List[str]): A list of URLs (strings) to process.
+        max_workers (Optional[int], optional): The maximum number of concurrent requests. Defaults to
+            `default_max_workers(urls)`.
+
+    Yields:
+        Tuple[int, Dict[str, Any]]: The index of the URL in `urls` and its result, in the format
+        returned by `_fetch_and_parse`.
+    """
+    async def indexed(index: int, url: str) -> Tuple[int, Dict[str, Any]]:
+        return index, await _fetch_and_parse(session, sem, url)
+
+    session = await _get_session()
+    sem = asyncio.Semaphore(max_workers or default_max_workers(urls))
+    tasks = [asyncio.create_task(indexed(index, url)) for index, url in enumerate(urls)]
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            yield await next_result
+    finally:
+        # Don't leave fetches running if the caller stops iterating early.
+        for task in tasks:
+            task.cancel()
+
+async def extract_data_from_urls_async(urls: List[str], max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Extracts data from a list of URLs concurrently using asyncio.
+
+    Collects the results of `iter_data_from_urls` and returns them in the order of `urls`.
+
+    Args:
+        urls (List[str]): A list of URLs (strings) to process.
+        max_workers (Optional[int], optional): The maximum number of concurrent requests. Defaults to
+            `default_max_workers(urls)`.
+
+    Returns:
+        List[Dict[str, Any]]: A list of dictionaries, one per URL and in the same order as `urls`,
+        in the format returned by `_fetch_and_parse`.
+    """
+    results: List[Dict[str, Any]] = [{} for _ in urls]
+    async for index, result in iter_data_from_urls(urls, max_workers):
+        results[index] = result
+    return results
+
+async def _fetch_many(urls: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Extracts data from a batch of URLs, fetching each distinct URL only once.
+
+    Args:
+        urls (List[str]): The URLs of the batch, possibly with duplicates.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: The result of each URL, in the format returned by `_fetch_and_parse`.
+    """
+    unique_urls = list(dict.fromkeys(urls))
+    results = await extract_data_from_urls_async(unique_urls)
+    return dict(zip(unique_urls, results))
+
+class URLBatcher:
+    """
+    Coalesces URLs requested concurrently (e.g. by several API calls) into shared batches.
+
+    URLs passed to `process` are queued until `max_batch_size` distinct URLs are waiting or
+    `max_queue_time` seconds have passed since the first one, then the whole batch is handed to
+    `process_batch`. A URL requested by several callers in the same batch is only fetched once.
+    Batches never span event loops: under WSGI every request runs on its own loop in its own
+    thread, so each loop gets its own queue and flush timer.
+
+    Args:
+        process_batch (Callable[[List[str]], Awaitable[Dict[str, Dict[str, Any]]]]): Coroutine function
+            taking the URLs of a batch and returning the result of each URL.
+        max_batch_size (int, optional): The number of distinct URLs that triggers a batch. Defaults to 200.
+        max_queue_time (float, optional): The longest a URL waits for its batch, in seconds. Defaults to 0.05.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[List[str]], Awaitable[Dict[str, Dict[str, Any]]]],
+        max_batch_size: int = 200,
+        max_queue_time: float = 0.05,
+    ) -> None:
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_queue_time = max_queue_time
+        # Keyed by event loop; each entry is only touched from the thread running that loop.
+        self._pending: Dict[asyncio.AbstractEventLoop, Dict[str, List[asyncio.Future]]] = {}
+        self._flush_handles: Dict[asyncio.AbstractEventLoop, asyncio.TimerHandle] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def process(self, url: str) -> Dict[str, Any]:
+        """
+        Queues a URL and waits for the batch it ends up in to be processed.
+
+        Args:
+            url (str): The URL to process.
+
+        Returns:
+            Dict[str, Any]: The result of the URL, in the format returned by `_fetch_and_parse`.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(loop, {})
+        pending.setdefault(url, []).append(future)
+        if len(pending) >= self.max_batch_size:
+            self._flush(loop)
+        elif loop not in self._flush_handles:
+            self._flush_handles[loop] = loop.call_later(self.max_queue_time, self._flush, loop)
+        return await future
+
+    def _flush(self, loop: asyncio.AbstractEventLoop) -> None:
+        """
+        Starts processing the URLs queued on an event loop as one batch.
+
+        Args:
+            loop (asyncio.AbstractEventLoop): The event loop whose queue is flushed; it must be the running loop.
+        """
+        handle = self._flush_handles.pop(loop, None)
+        if handle is not None:
+            handle.cancel()
+        batch = self._pending.pop(loop, None)
+        if batch:
+            task = loop.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: Dict[str, List[asyncio.Future]]) -> None:
+        """
+        Processes a batch and hands each result to the callers waiting for it.
+
+        Args:
+            batch (Dict[str, List[asyncio.Future]]): The futures of the callers waiting on each URL.
+        """
+        try:
+            results = await self.process_batch(list(batch))
+        except Exception as e:
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+
+        for url, futures in batch.items():
+            for future in futures:
+                if not future.done():
+                    future.set_result(results[url])
+
+# Shared by all API requests, so concurrent scrapes of the same URLs are fetched once.
+url_batcher = URLBatcher(_fetch_many)
+
+def extract_data_from_urls(urls: List[str], max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Extracts data from a list of URLs concurrently.
+
+    Synchronous wrapper around `extract_data_from_urls_async`. It runs the extraction on its own
+    event loop and closes that loop's session afterwards, so it must not be called from async code.
 
     Args:
         urls (List[str]): A list of URLs (strings) to process. Each URL will be processed concurrently.
-        max_workers (int, optional): The maximum number of threads to use for concurrent processing.
-            Defaults to 5. Increasing this value can speed up processing, but may consume more system resources.
-    
+        max_workers (Optional[int], optional): The maximum number of concurrent requests. Defaults to
+            `default_max_workers(urls)`.
+
     Returns:
         List[Dict[str, Any]]: A list of dictionaries, where each dictionary contains the extracted data
-        from one URL. The exact structure of the dictionary depends on the implementation of `process_url`.
+        from one URL. The exact structure of the dictionary depends on the implementation of `_fetch_and_parse`.
     """
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        return list(executor.map(process_url, urls))
+    async def run() -> List[Dict[str, Any]]:
+        try:
+            return await extract_data_from_urls_async(urls, max_workers)
+        finally:
+            await close_session()
 
+    return asyncio.run(run())
 
 
 if __name__ == "__main__":